@@ -3,6 +3,7 @@
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
+from agentes.registro_modelos import obter_modelo
 
 def configurar_agente():
     """
@@ -21,14 +22,12 @@ def configurar_agente():
         # Propaga o erro para que a aplicação principal possa parar
         raise 
 
-def extrair_dados_com_llm(texto_da_nota):
+def extrair_dados_com_llm(texto_da_nota, api_key):
     """Envia o texto para o Gemini e pede para extrair os dados na estrutura JSON definida."""
     
-    # Nota: A configuração (genai.configure) deve ter sido chamada
-    # antes desta função (ex: no início da aplicação).
-    
+    # O modelo vem do registro: um cliente por chave, sem depender do genai.configure global.
     generation_config = {"temperature": 0.1}
-    model = genai.GenerativeModel(model_name="gemini-2.5-flash", generation_config=generation_config)
+    model = obter_modelo(api_key, "gemini-2.5-flash", generation_config)
     
     prompt = f"""
     Sua tarefa é ser um especialista em extração de dados de notas fiscais.
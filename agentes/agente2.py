@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from datetime import datetime
 import json
 import re
+from agentes import replica
 
 # Variável global para o cliente Supabase
 supabase: Client = None
@@ -123,6 +124,9 @@ def salvar_movimento(supabase_client: Client, dados_json: dict):
 
         # 2. Chamar a função RPC
         response = supabase_client.rpc("salvar_nota_fiscal_completa", params).execute()
+
+        # 3. Atualizar a réplica local usada pelo chat (Agente 3), sem atrasar o salvamento
+        replica.agendar_sincronizacao(supabase_client)
         
         return response.data
         
@@ -1,14 +1,16 @@
-import google.generativeai as genai
 from supabase import Client
+from agentes.registro_modelos import obter_modelo
+from agentes import replica
 import json
 import re
 
-def get_database_schema():
+def get_database_schema(incluir_agregados: bool = False):
     """
     [CORRIGIDO]
     Define e retorna o esquema do banco, com base na imagem do ERD fornecida.
+    A tabela 'agregado_mensal' só existe na réplica local e só entra com 'incluir_agregados'.
     """
-    return """
+    schema = """
     -- Tabela de Pessoas (Fornecedores e Faturados)
     CREATE TABLE pessoas (
       "idPessoas" INT PRIMARY KEY,
@@ -56,6 +58,20 @@ def get_database_schema():
       "Classificacao_idClassificacao" INT -- FK para classificacao
     );
     """
+    if incluir_agregados:
+        schema += """
+    -- Agregados pré-calculados: total mensal por classificação e fornecedor
+    CREATE TABLE agregado_mensal (
+      mes DATE, -- primeiro dia do mês de dataemissao
+      "idClassificacao" INT,
+      classificacao VARCHAR(100), -- classificacao.descricao
+      "idFornecedor" INT,
+      fornecedor VARCHAR(255), -- pessoas.razaosocial
+      quantidade_notas INT,
+      valor_total NUMERIC
+    );
+    """
+    return schema
 
 def is_query_safe(sql_query: str) -> bool:
     """
@@ -75,15 +91,22 @@ def is_query_safe(sql_query: str) -> bool:
             
     return True
 
-def run_text_to_sql(supabase_client: Client, user_question: str):
+def run_text_to_sql(supabase_client: Client, user_question: str, api_key: str):
     """
     Orquestra o fluxo completo de Text-to-SQL.
     """
     try:
-        schema = get_database_schema()
+        # A réplica local (DuckDB) responde sem carregar o banco de produção; enquanto ela não tiver
+        # dados, a consulta vai ao Supabase. O prompt é montado para o banco que vai executar a SQL.
+        usar_replica = replica.pronta(supabase_client)
+        dialeto = "DuckDB" if usar_replica else "PostgreSQL"
+        schema = get_database_schema(incluir_agregados=usar_replica)
+        regra_agregados = ""
+        if usar_replica:
+            regra_agregados = "6. Para totais por mês, classificação e/ou fornecedor, prefira a tabela 'agregado_mensal', que dispensa os JOINs."
         
         prompt_sql_generator = f"""
-        Você é um especialista em PostgreSQL. Sua tarefa é gerar uma consulta SQL para responder a uma pergunta do usuário,
+        Você é um especialista em {dialeto}. Sua tarefa é gerar uma consulta SQL para responder a uma pergunta do usuário,
         com base no seguinte esquema de banco de dados:
 
         Esquema:
@@ -94,7 +117,7 @@ def run_text_to_sql(supabase_client: Client, user_question: str):
 
         Regras:
         1. Gere APENAS a consulta SQL, sem explicações, sem ```sql.
-        2. Certifique-se de que a consulta seja compatível com PostgreSQL.
+        2. Certifique-se de que a consulta seja compatível com {dialeto}.
         3. Use os nomes de colunas e tabelas exatamente como estão no esquema (incluindo aspas, se houver).
         4. Sempre use a data de hoje (para perguntas como "este mês") como: CURRENT_DATE
 
@@ -106,11 +129,12 @@ def run_text_to_sql(supabase_client: Client, user_question: str):
            JOIN movimentocontas_has_classificacao AS mhc ON m."idMovimentoContas" = mhc."MovimentoContas_idMovimentoContas"
            JOIN classificacao AS c ON mhc."Classificacao_idClassificacao" = c."idClassificacao"
            WHERE c.descricao = 'MANUTENÇÃO E OPERAÇÃO' ...
+        {regra_agregados}
 
         Consulta SQL:
         """
         
-        model = genai.GenerativeModel("gemini-2.5-flash") 
+        model = obter_modelo(api_key, "gemini-2.5-flash")
         response_sql = model.generate_content(prompt_sql_generator)
         
         raw_sql_response = response_sql.text.strip()
@@ -131,16 +155,18 @@ def run_text_to_sql(supabase_client: Client, user_question: str):
         
         print(f"DEBUG (Agente 3): SQL Limpo e Gerado: {sql_query}")
         
-        if not is_query_safe(sql_query):
+        if not is_query_safe(sql_query) or (usar_replica and not replica.consulta_permitida(sql_query)):
             print(f"DEBUG (Agente 3): Consulta bloqueada por segurança: {sql_query}")
             return "Desculpe, sua pergunta resultou em uma consulta que não é permitida por motivos de segurança."
 
-        data_result = supabase_client.rpc(
-            "run_safe_query", 
-            {"query_text": sql_query}
-        ).execute()
-        
-        raw_data = data_result.data
+        if usar_replica:
+            raw_data = replica.consultar(supabase_client, sql_query)
+        else:
+            data_result = supabase_client.rpc(
+                "run_safe_query", 
+                {"query_text": sql_query}
+            ).execute()
+            raw_data = data_result.data
         
         print(f"DEBUG (Agente 3): Dados recebidos do DB: {raw_data}")
         
@@ -149,7 +175,7 @@ def run_text_to_sql(supabase_client: Client, user_question: str):
         A pergunta original do usuário foi: "{user_question}"
         
         Os dados obtidos do banco de dados (em formato JSON) são:
-        {json.dumps(raw_data)}
+        {json.dumps(raw_data, default=str)}
 
         Sua tarefa é usar os dados para dar uma resposta completa e amigável ao usuário, em português.
         - Se os dados forem um número (como um SUM ou COUNT), responda diretamente (ex: "O valor total é R$ 123,45.").
@@ -0,0 +1,70 @@
+# agentes/registro_modelos.py
+
+import os
+import threading
+from collections import OrderedDict
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+# ATENÇÃO: este módulo usa a API privada do google-generativeai (client._ClientManager e
+# GenerativeModel._client) para ter um cliente por chave sem alterar o genai.configure global.
+# Isso depende da versão fixada no requirements.txt (0.7.1); revise ao atualizar a biblioteca.
+if not hasattr(genai_client, "_ClientManager"):
+    raise ImportError(
+        f"google-generativeai {genai.__version__} não possui client._ClientManager; "
+        "o registro de modelos foi escrito para a versão 0.7.1."
+    )
+
+# Quantidade máxima de modelos mantidos em memória (os menos usados recentemente são descartados)
+MAX_MODELOS = int(os.getenv("GEMINI_MAX_MODELOS", "32"))
+
+# Cache LRU de modelos já configurados, indexado por (api_key, modelo, generation_config)
+_modelos = OrderedDict()
+_lock = threading.Lock()
+
+def _chave_generation_config(generation_config):
+    """Converte o generation_config (dict) em algo que possa ser usado como chave."""
+    if not generation_config:
+        return ()
+    return tuple(sorted(generation_config.items()))
+
+def _criar_modelo(api_key, model_name, generation_config):
+    """
+    Cria um GenerativeModel com um cliente próprio, configurado apenas com esta api_key.
+    Não chama genai.configure, então o estado global do processo não é alterado.
+    """
+    gerenciador = genai_client._ClientManager()
+    gerenciador.configure(api_key=api_key)
+
+    model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+    if not hasattr(model, "_client"):
+        raise RuntimeError(
+            f"google-generativeai {genai.__version__} não expõe GenerativeModel._client; "
+            "o registro de modelos foi escrito para a versão 0.7.1."
+        )
+    # O modelo usaria o cliente global na primeira chamada; fixamos o cliente desta chave.
+    model._client = gerenciador.get_default_client("generative")
+    return model
+
+def obter_modelo(api_key: str, model_name: str, generation_config: dict = None):
+    """
+    Retorna o modelo configurado para (api_key, model_name, generation_config).
+    O modelo é criado uma única vez e reutilizado entre requisições e threads; no máximo
+    MAX_MODELOS ficam em memória, descartando os usados há mais tempo.
+    """
+    if not api_key:
+        raise ValueError("A chave GEMINI_API_KEY não foi informada.")
+
+    chave = (api_key, model_name, _chave_generation_config(generation_config))
+    with _lock:
+        model = _modelos.get(chave)
+        if model is not None:
+            _modelos.move_to_end(chave)
+            return model
+
+        model = _criar_modelo(api_key, model_name, generation_config)
+        _modelos[chave] = model
+        while len(_modelos) > MAX_MODELOS:
+            # Sem referências, o cliente gRPC do modelo descartado é liberado pelo coletor
+            _modelos.popitem(last=False)
+    return model
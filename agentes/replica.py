@@ -0,0 +1,396 @@
+# agentes/replica.py
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import duckdb
+from supabase import Client
+
+# Pasta dos arquivos da réplica e intervalos de sincronização com o Supabase: a incremental (registros
+# novos/alterados) e a recarga completa, que é a única forma de ver edições e exclusões em tabelas
+# sem COLUNA_ATUALIZACAO
+REPLICA_DIR = os.getenv("REPLICA_DIR", "replica")
+INTERVALO_SINCRONIZACAO = timedelta(seconds=int(os.getenv("REPLICA_INTERVALO_SEGUNDOS", "60")))
+INTERVALO_RECARGA = timedelta(seconds=int(os.getenv("REPLICA_INTERVALO_RECARGA_SEGUNDOS", "3600")))
+TAMANHO_PAGINA = 1000  # Limite padrão de linhas por resposta do PostgREST
+
+# Coluna de data de alteração usada na sincronização por timestamp, quando existir no Supabase
+COLUNA_ATUALIZACAO = os.getenv("REPLICA_COLUNA_ATUALIZACAO", "updated_at")
+
+# Tabelas espelhadas (sem chave primária: o DuckDB 1.1 rejeita reinserir, na mesma transação, uma
+# chave que acabou de ser apagada). A sincronização incremental traz os registros com id maior que o
+# maior id local e, nas tabelas com "id_unico" que tenham COLUNA_ATUALIZACAO no Supabase, também os
+# alterados desde a última sincronização.
+TABELAS = {
+    "pessoas": {
+        "id": "idPessoas",
+        "id_unico": True,
+        "colunas": {
+            "idPessoas": "BIGINT",
+            "documento": "VARCHAR",
+            "razaosocial": "VARCHAR",
+            "fantasia": "VARCHAR",
+            "tipo": "VARCHAR",
+            "status": "VARCHAR",
+        },
+    },
+    "classificacao": {
+        "id": "idClassificacao",
+        "id_unico": True,
+        "colunas": {
+            "idClassificacao": "BIGINT",
+            "descricao": "VARCHAR",
+            "tipo": "VARCHAR",
+            "status": "VARCHAR",
+        },
+    },
+    "movimentocontas": {
+        "id": "idMovimentoContas",
+        "id_unico": True,
+        "colunas": {
+            "idMovimentoContas": "BIGINT",
+            "numeronotafiscal": "VARCHAR",
+            "dataemissao": "DATE",
+            "valortotal": "DECIMAL(15,2)",
+            "Pessoas_idFornecedor": "BIGINT",
+            "Pessoas_idFaturado": "BIGINT",
+            "tipo": "VARCHAR",
+            "descricao": "VARCHAR",
+            "status": "VARCHAR",
+        },
+    },
+    "parcelacontas": {
+        "id": "idParcelaContas",
+        "id_unico": True,
+        "colunas": {
+            "idParcelaContas": "BIGINT",
+            "datavencimento": "DATE",
+            "valorpago": "DECIMAL(15,2)",
+            "valorsaldo": "DECIMAL(15,2)",
+            "statusparcela": "VARCHAR",
+            "MovimentoContas_idMovimentoContas": "BIGINT",
+        },
+    },
+    "movimentocontas_has_classificacao": {
+        # Os vínculos são gravados junto com o movimento, então o id do movimento serve de marca
+        "id": "MovimentoContas_idMovimentoContas",
+        "id_unico": False,
+        "colunas": {
+            "MovimentoContas_idMovimentoContas": "BIGINT",
+            "Classificacao_idClassificacao": "BIGINT",
+        },
+    },
+}
+
+# Agregados mensais por classificação e fornecedor, recalculados a cada sincronização
+SQL_AGREGADO_MENSAL = """
+    CREATE OR REPLACE TABLE agregado_mensal AS
+    SELECT
+      CAST(DATE_TRUNC('month', m.dataemissao) AS DATE) AS mes,
+      c."idClassificacao" AS "idClassificacao",
+      c.descricao AS classificacao,
+      m."Pessoas_idFornecedor" AS "idFornecedor",
+      p.razaosocial AS fornecedor,
+      COUNT(*) AS quantidade_notas,
+      SUM(m.valortotal) AS valor_total
+    FROM movimentocontas AS m
+    LEFT JOIN movimentocontas_has_classificacao AS mhc ON m."idMovimentoContas" = mhc."MovimentoContas_idMovimentoContas"
+    LEFT JOIN classificacao AS c ON mhc."Classificacao_idClassificacao" = c."idClassificacao"
+    LEFT JOIN pessoas AS p ON m."Pessoas_idFornecedor" = p."idPessoas"
+    GROUP BY ALL
+"""
+
+class _TravaLeituraEscrita:
+    """Permite várias consultas simultâneas, mas dá exclusividade à gravação da sincronização."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._leitores = 0
+        self._escrevendo = False
+
+    @contextmanager
+    def leitura(self):
+        with self._cond:
+            while self._escrevendo:
+                self._cond.wait()
+            self._leitores += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._leitores -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def escrita(self):
+        with self._cond:
+            while self._escrevendo or self._leitores:
+                self._cond.wait()
+            self._escrevendo = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._escrevendo = False
+                self._cond.notify_all()
+
+class Replica:
+    """
+    Réplica analítica local (DuckDB) de um projeto Supabase, usada para as consultas do chat.
+
+    As consultas geradas pelo LLM rodam numa conexão somente leitura, sem acesso a arquivos
+    externos e com a configuração travada. O DuckDB não permite abrir o mesmo arquivo em modos
+    diferentes no mesmo processo, então a sincronização fecha essa conexão, grava por uma conexão
+    de escrita temporária e depois reabre a de leitura.
+
+    A sincronização roda só numa thread própria da réplica: as requisições apenas a agendam e
+    continuam usando os dados já replicados, e vários pedidos seguidos viram uma única execução.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._trava = _TravaLeituraEscrita()
+        self._pendente = threading.Event()
+        self._lock_thread = threading.Lock()
+        self._thread = None
+        self._supabase_client = None
+        self._criar_tabelas()
+        self._leitura = self._abrir_leitura()
+
+    def _abrir_leitura(self):
+        return duckdb.connect(self.caminho, read_only=True, config={
+            "enable_external_access": False,
+            "lock_configuration": True,
+        })
+
+    def _criar_tabelas(self):
+        con = duckdb.connect(self.caminho)
+        try:
+            for tabela, config in TABELAS.items():
+                colunas = ", ".join(f'"{coluna}" {tipo}' for coluna, tipo in config["colunas"].items())
+                con.execute(f"CREATE TABLE IF NOT EXISTS {tabela} ({colunas})")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS _sincronizacao (
+                  tabela VARCHAR PRIMARY KEY,
+                  ultima_atualizacao VARCHAR, -- maior COLUNA_ATUALIZACAO já recebida
+                  sincronizado_em TIMESTAMP,
+                  recarregado_em TIMESTAMP -- última recarga completa
+                )
+            """)
+            con.execute(SQL_AGREGADO_MENSAL)
+        finally:
+            con.close()
+
+    def _ler(self, sql_query: str, params=None):
+        """Executa uma leitura na conexão somente leitura."""
+        with self._trava.leitura():
+            con = self._leitura.cursor()
+            try:
+                resultado = con.execute(sql_query, params)
+                colunas = [desc[0] for desc in resultado.description]
+                return [dict(zip(colunas, linha)) for linha in resultado.fetchall()]
+            finally:
+                con.close()
+
+    def _estado(self):
+        """Retorna {tabela: linha de _sincronizacao} das tabelas já sincronizadas."""
+        return {linha["tabela"]: linha for linha in self._ler("SELECT * FROM _sincronizacao")}
+
+    def pronta(self, supabase_client: Client) -> bool:
+        """
+        Indica se a réplica já tem dados para responder. Nunca espera a rede: se os dados
+        estiverem vencidos (ou ausentes), apenas agenda uma sincronização.
+        """
+        estado = self._estado()
+        if set(estado) < set(TABELAS):
+            self.agendar_sincronizacao(supabase_client)
+            return False
+        ultima = min(linha["sincronizado_em"] for linha in estado.values())
+        if datetime.now() - ultima >= INTERVALO_SINCRONIZACAO:
+            self.agendar_sincronizacao(supabase_client)
+        return True
+
+    def agendar_sincronizacao(self, supabase_client: Client):
+        """Pede uma sincronização à thread da réplica (criada no primeiro pedido) e retorna na hora."""
+        self._supabase_client = supabase_client
+        with self._lock_thread:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True)
+                self._thread.start()
+        self._pendente.set()
+
+    def _executar(self):
+        """Laço da thread: sincroniza a cada pedido e, sem pedidos, a cada INTERVALO_RECARGA."""
+        while True:
+            self._pendente.wait(timeout=INTERVALO_RECARGA.total_seconds())
+            self._pendente.clear()
+            try:
+                self.sincronizar(self._supabase_client)
+            except Exception as e:
+                print(f"Erro ao sincronizar a réplica local: {e}")
+
+    def sincronizar(self, supabase_client: Client):
+        """
+        Atualiza a réplica com o Supabase. Faz uma recarga completa na primeira vez e a cada
+        INTERVALO_RECARGA; nas demais, traz apenas os registros novos e alterados.
+        """
+        estado = self._estado()
+        agora = datetime.now()
+        completa = set(estado) < set(TABELAS) or any(
+            linha["recarregado_em"] is None or agora - linha["recarregado_em"] >= INTERVALO_RECARGA
+            for linha in estado.values()
+        )
+
+        # Busca e prepara os arquivos antes de travar a réplica, para as consultas não esperarem a rede
+        recebidos = {}
+        try:
+            for tabela, config in TABELAS.items():
+                marca = estado[tabela]["ultima_atualizacao"] if tabela in estado else None
+                if completa:
+                    linhas = _buscar_linhas(supabase_client, tabela, config["id"])
+                else:
+                    maior_id = self._ler(f'SELECT MAX("{config["id"]}") AS maior FROM {tabela}')[0]["maior"]
+                    linhas = _buscar_linhas(supabase_client, tabela, config["id"], acima_de=maior_id)
+                    if marca and config["id_unico"]:
+                        linhas += _buscar_linhas(supabase_client, tabela, config["id"], alterados_desde=marca)
+
+                ids = None
+                if config["id_unico"]:
+                    # Um registro pode vir nas duas buscas; fica a última versão de cada id
+                    linhas = list({linha[config["id"]]: linha for linha in linhas}.values())
+                    ids = [linha[config["id"]] for linha in linhas]
+                    marcas = [str(l[COLUNA_ATUALIZACAO]) for l in linhas if l.get(COLUNA_ATUALIZACAO)]
+                    marca = max(marcas + ([marca] if marca else []), default=None)
+
+                recebidos[tabela] = (_gravar_arquivo(linhas, config["colunas"]), ids, marca, len(linhas))
+
+            with self._trava.escrita():
+                self._leitura.close()
+                con = duckdb.connect(self.caminho)
+                try:
+                    con.execute("BEGIN TRANSACTION")
+                    try:
+                        for tabela, config in TABELAS.items():
+                            arquivo, ids, marca, _ = recebidos[tabela]
+                            if completa:
+                                con.execute(f"DELETE FROM {tabela}")
+                            elif ids:
+                                # Remove as versões antigas dos registros alterados antes de inseri-los
+                                con.execute(
+                                    f'DELETE FROM {tabela} WHERE "{config["id"]}" IN (SELECT UNNEST(?::BIGINT[]))',
+                                    [ids]
+                                )
+                            if arquivo:
+                                _carregar_arquivo(con, tabela, arquivo, config["colunas"])
+                            recarregado_em = agora if completa else estado[tabela]["recarregado_em"]
+                            con.execute(
+                                "INSERT OR REPLACE INTO _sincronizacao VALUES (?, ?, ?, ?)",
+                                [tabela, marca, agora, recarregado_em]
+                            )
+                        con.execute(SQL_AGREGADO_MENSAL)
+                        con.execute("COMMIT")
+                    except Exception:
+                        con.execute("ROLLBACK")
+                        raise
+                finally:
+                    con.close()
+                    self._leitura = self._abrir_leitura()
+        finally:
+            for arquivo, _, _, _ in recebidos.values():
+                if arquivo:
+                    os.remove(arquivo)
+
+        tipo = "completa" if completa else "incremental"
+        print(f"INFO: Réplica sincronizada ({tipo}, {sum(r[3] for r in recebidos.values())} registros recebidos).")
+
+    def consultar(self, sql_query: str):
+        """Executa uma única consulta SELECT na conexão somente leitura e retorna as linhas como dicionários."""
+        if not consulta_permitida(sql_query):
+            raise ValueError("A réplica aceita apenas uma única consulta SELECT.")
+        return self._ler(sql_query)
+
+
+def consulta_permitida(sql_query: str) -> bool:
+    """Verifica se o texto contém exatamente uma instrução, e que ela é um SELECT."""
+    try:
+        instrucoes = duckdb.extract_statements(sql_query)
+    except Exception:
+        return False
+    return len(instrucoes) == 1 and instrucoes[0].type == duckdb.StatementType.SELECT
+
+def _buscar_linhas(supabase_client: Client, tabela: str, coluna_id: str, acima_de=None, alterados_desde=None):
+    """
+    Lê a tabela do Supabase em páginas. Com 'acima_de', só os ids maiores; com 'alterados_desde',
+    só os registros com COLUNA_ATUALIZACAO a partir dessa data.
+    """
+    linhas = []
+    inicio = 0
+    while True:
+        query = supabase_client.table(tabela).select("*")
+        if acima_de is not None:
+            query = query.gt(coluna_id, acima_de)
+        if alterados_desde is not None:
+            # gte (e não gt) para não perder registros com a mesma data; a gravação substitui pelo id
+            query = query.gte(COLUNA_ATUALIZACAO, alterados_desde)
+        response = query.order(coluna_id).range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+        linhas.extend(response.data)
+        if len(response.data) < TAMANHO_PAGINA:
+            return linhas
+        inicio += TAMANHO_PAGINA
+
+def _gravar_arquivo(linhas: list, colunas: dict):
+    """Grava as linhas (só as colunas da réplica) num arquivo JSON temporário, uma por linha."""
+    if not linhas:
+        return None
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as arquivo:
+        for linha in linhas:
+            arquivo.write(json.dumps({coluna: linha.get(coluna) for coluna in colunas}, default=str) + "\n")
+    return arquivo.name
+
+def _carregar_arquivo(con, tabela: str, arquivo: str, colunas: dict):
+    """Insere o arquivo de uma vez com read_json, bem mais rápido que um INSERT por linha."""
+    lista_colunas = ", ".join(f'"{coluna}"' for coluna in colunas)
+    tipos = ", ".join(f"'{coluna}': '{tipo}'" for coluna, tipo in colunas.items())
+    con.execute(
+        f"INSERT INTO {tabela} ({lista_colunas}) SELECT {lista_colunas} "
+        f"FROM read_json(?, format = 'newline_delimited', columns = {{{tipos}}})",
+        [arquivo]
+    )
+
+
+# Uma réplica por credencial do Supabase (url e chave podem vir da sessão de cada usuário), para que
+# uma sessão com chave restrita (RLS) nunca leia dados sincronizados com uma chave privilegiada
+_replicas = {}
+_lock_replicas = threading.Lock()
+
+def obter_replica(supabase_client: Client) -> Replica:
+    """Retorna a réplica da credencial do cliente, criando o arquivo na primeira vez."""
+    credencial = f"{supabase_client.supabase_url}\0{supabase_client.supabase_key}"
+    chave = hashlib.sha256(credencial.encode("utf-8")).hexdigest()
+    replica = _replicas.get(chave)
+    if replica is not None:
+        return replica
+
+    with _lock_replicas:
+        replica = _replicas.get(chave)
+        if replica is None:
+            os.makedirs(REPLICA_DIR, exist_ok=True)
+            replica = Replica(os.path.join(REPLICA_DIR, chave[:16] + ".duckdb"))
+            _replicas[chave] = replica
+    return replica
+
+def pronta(supabase_client: Client) -> bool:
+    """Indica se a réplica da credencial pode responder (agendando a sincronização, se preciso)."""
+    return obter_replica(supabase_client).pronta(supabase_client)
+
+def agendar_sincronizacao(supabase_client: Client):
+    """Agenda a sincronização da réplica da credencial, sem esperar por ela."""
+    obter_replica(supabase_client).agendar_sincronizacao(supabase_client)
+
+def consultar(supabase_client: Client, sql_query: str):
+    """Executa uma consulta somente leitura nos dados já replicados, sem acessar o Supabase."""
+    return obter_replica(supabase_client).consultar(sql_query)
@@ -9,7 +9,6 @@ from flask import (
 )
 from supabase import create_client
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 from agentes import agente1, agente2, agente3
 
@@ -33,13 +32,12 @@ def get_supabase():
         print(f"Erro ao conectar Supabase: {e}")
         return None
 
-def configure_genai_session():
-    """Configura a API do Gemini com a chave da sessão ou .env"""
-    api_key = session.get('GEMINI_API_KEY') or os.getenv('GEMINI_API_KEY')
-    if api_key:
-        genai.configure(api_key=api_key)
-        return True
-    return False
+def get_gemini_api_key():
+    """
+    Recupera a chave do Gemini da sessão (prioridade) ou do .env.
+    A chave é repassada aos agentes, que obtêm o modelo no registro (sem configuração global).
+    """
+    return session.get('GEMINI_API_KEY') or os.getenv('GEMINI_API_KEY')
 
 @app.before_request
 def check_setup():
@@ -53,12 +51,10 @@ def check_setup():
         return
 
     supabase = get_supabase()
-    has_gemini = session.get('GEMINI_API_KEY') or os.getenv('GEMINI_API_KEY')
+    has_gemini = get_gemini_api_key()
 
     if not supabase or not has_gemini:
         return redirect(url_for('setup'))
-    
-    configure_genai_session()
 
 
 REGRAS_DE_CLASSIFICACAO = {
@@ -121,7 +117,7 @@ def setup():
         session['SUPABASE_KEY'] = request.form.get('supabase_key')
         session['GEMINI_API_KEY'] = request.form.get('gemini_key')
         
-        if get_supabase() and configure_genai_session():
+        if get_supabase() and get_gemini_api_key():
             flash('Sistema configurado com sucesso!', 'success')
             return redirect(url_for('index'))
         else:
@@ -155,7 +151,7 @@ def upload_file():
         flash("Erro: Não foi possível ler o texto do PDF.", "error")
         return redirect(url_for('index'))
         
-    json_extraido_str = agente1.extrair_dados_com_llm(texto_pdf)
+    json_extraido_str = agente1.extrair_dados_com_llm(texto_pdf, get_gemini_api_key())
     if not json_extraido_str:
         flash("Erro: Falha na comunicação com a API do Gemini.", "error")
         return redirect(url_for('index'))
@@ -220,7 +216,7 @@ def ask_agent():
             return jsonify({"error": "Nenhuma pergunta fornecida."}), 400
 
         supabase_client = get_supabase()
-        answer = agente3.run_text_to_sql(supabase_client, question)
+        answer = agente3.run_text_to_sql(supabase_client, question, get_gemini_api_key())
         return jsonify({"answer": answer})
 
     except Exception as e: